@@ -6,6 +6,7 @@ Feature: System Health Checks
   Background:
     Given the docker-compose stack is running
 
+  @fixture.postgres
   Scenario: PostgreSQL database is healthy
     When I check the PostgreSQL health endpoint
     Then the database should be accepting connections
@@ -28,7 +29,7 @@ Feature: System Health Checks
     Then the response status should be 200
     And the cluster status should be "green" or "yellow"
 
-  @integration
+  @integration @fixture.wbia @fixture.wildbook
   Scenario: All services can communicate
     Given WBIA is connected to PostgreSQL
     And Wildbook is connected to PostgreSQL
@@ -3,8 +3,25 @@ Step definitions for health check scenarios
 """
 from behave import given, when, then
 import requests
+import orjson
 import psycopg2
 from assertpy import assert_that
+from step_helpers import assert_service_up
+
+
+def _parse(response):
+    """Decode a JSON response body, or None if it is not JSON"""
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _ping(conn):
+    """Cheap liveness check for a pooled connection"""
+    # psycopg2 rejects empty query strings client-side, so use the cheapest real statement
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
 
 
 @given('the docker-compose stack is running')
@@ -18,18 +35,25 @@ def step_verify_docker_stack(context):
 @when('I check the PostgreSQL health endpoint')
 def step_check_postgres_health(context):
     """Check if PostgreSQL is accepting connections"""
+    assert hasattr(context, 'pg_pool'), "context.pg_pool is unset; tag the feature or scenario with @fixture.postgres"
+    if context.pg_pool is None:
+        context.db_healthy = False
+        context.db_error = context.pg_pool_error
+        return
     try:
-        conn = psycopg2.connect(
-            host='localhost',
-            port=5433,
-            user='postgres',
-            password=context.db_uri.split(':')[2].split('@')[0],
-            database='postgres',
-            connect_timeout=5
-        )
+        conn = context.pg_pool.getconn()
+        try:
+            _ping(conn)
+        except psycopg2.OperationalError:
+            # Stale pooled connection: discard it and retry on a fresh one
+            context.pg_pool.putconn(conn, close=True)
+            conn = context.pg_pool.getconn()
+            # Track it first so after_scenario returns it even if this ping fails
+            context.db_connection = conn
+            _ping(conn)
         context.db_connection = conn
         context.db_healthy = True
-    except Exception as e:
+    except psycopg2.Error as e:
         context.db_healthy = False
         context.db_error = str(e)
 
@@ -43,15 +67,9 @@ def step_verify_db_connection(context):
 @then('the "{db_name}" database should exist')
 def step_verify_database_exists(context, db_name):
     """Verify specific database exists"""
-    cursor = context.db_connection.cursor()
-    cursor.execute(
-        "SELECT datname FROM pg_database WHERE datname = %s",
-        (db_name,)
-    )
-    result = cursor.fetchone()
-    assert_that(result).is_not_none()
-    assert_that(result[0]).is_equal_to(db_name)
-    cursor.close()
+    # Answered from the pg_database snapshot taken by the @fixture.postgres fixture
+    assert hasattr(context, 'pg_databases'), "context.pg_databases is unset; tag the feature or scenario with @fixture.postgres"
+    assert_that(context.pg_databases).contains(db_name)
 
 
 @when('I send a GET request to "{endpoint}"')
@@ -61,10 +79,7 @@ def step_send_get_request_wbia(context, endpoint):
     try:
         context.response = context.session.get(url, timeout=context.timeout)
         context.status_code = context.response.status_code
-        try:
-            context.response_json = context.response.json()
-        except:
-            context.response_json = None
+        context.response_json = _parse(context.response)
     except requests.RequestException as e:
         context.response = None
         context.status_code = None
@@ -80,8 +95,9 @@ def step_verify_status_code(context, status_code):
 @then('the response should be valid JSON')
 def step_verify_valid_json(context):
     """Verify response is valid JSON"""
-    assert_that(context.response_json).is_not_none()
-    assert_that(context.response_json).is_instance_of(dict)
+    # isinstance also rejects None, so one check covers both
+    assert isinstance(context.response_json, dict), \
+        f"expected a JSON object, got {type(context.response_json).__name__}"
 
 
 @then('the response should contain "{key}"')
@@ -95,9 +111,19 @@ def step_visit_wildbook_homepage(context):
     """Visit Wildbook homepage"""
     url = context.wildbook_url
     try:
-        context.response = context.session.get(url, timeout=context.timeout)
-        context.status_code = context.response.status_code
-        context.response_text = context.response.text
+        # Keep at most the first 64 KiB: enough for title/meta checks on any page size.
+        # iter_content yields one chunk per transfer-encoding chunk, so join until full.
+        # Pages smaller than that are read to the end and the connection goes back to
+        # the keep-alive pool; larger pages are cut off and urllib3 drops the connection.
+        head = b''
+        with context.session.get(url, timeout=context.timeout, stream=True) as response:
+            context.response = response
+            context.status_code = response.status_code
+            for chunk in response.iter_content(8192):
+                head += chunk
+                if len(head) >= 64 * 1024:
+                    break
+        context.response_text = head[:64 * 1024].decode('utf-8', 'ignore')
     except requests.RequestException as e:
         context.response = None
         context.status_code = None
@@ -117,7 +143,7 @@ def step_send_get_request_opensearch(context, endpoint):
     try:
         context.response = context.session.get(url, timeout=context.timeout)
         context.status_code = context.response.status_code
-        context.response_json = context.response.json()
+        context.response_json = _parse(context.response)
     except requests.RequestException as e:
         context.response = None
         context.status_code = None
@@ -134,23 +160,15 @@ def step_verify_cluster_status(context, status1, status2):
 @given('WBIA is connected to PostgreSQL')
 def step_verify_wbia_db_connection(context):
     """Verify WBIA can connect to its database"""
-    response = context.session.get(
-        f"{context.wbia_url}/api/core/db/info/",
-        timeout=context.timeout
-    )
-    assert_that(response.status_code).is_equal_to(200)
+    assert_service_up(context, 'wbia_db_up', 'fixture.wbia')
 
 
 @given('Wildbook is connected to PostgreSQL')
 def step_verify_wildbook_db_connection(context):
     """Verify Wildbook can connect to its database"""
     # This would need a specific health endpoint in Wildbook
-    # For now, just verify the app responds
-    response = context.session.get(
-        context.wildbook_url,
-        timeout=context.timeout
-    )
-    assert_that(response.status_code).is_in(200, 302)
+    # For now, just verify the app responded to the startup probe
+    assert_service_up(context, 'wildbook_up', 'fixture.wildbook')
 
 
 @given('Wildbook can reach WBIA')
@@ -158,11 +176,8 @@ def step_verify_wildbook_wbia_connection(context):
     """Verify Wildbook can communicate with WBIA"""
     # This would ideally call a Wildbook endpoint that checks WBIA connectivity
     # For now, verify both are up
-    wbia_response = context.session.get(
-        f"{context.wbia_url}/api/core/db/info/",
-        timeout=context.timeout
-    )
-    assert_that(wbia_response.status_code).is_equal_to(200)
+    assert_service_up(context, 'wildbook_up', 'fixture.wildbook')
+    assert_service_up(context, 'wbia_up', 'fixture.wbia')
 
 
 @then('the system should be fully operational')
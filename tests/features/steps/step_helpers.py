@@ -0,0 +1,10 @@
+"""
+Helpers shared by the step definition modules
+"""
+from assertpy import assert_that
+
+
+def assert_service_up(context, flag, tag):
+    """Assert a probe flag set by a @fixture.* tag, naming the tag if it is missing"""
+    assert hasattr(context, flag), f"context.{flag} is unset; tag the feature or scenario with @{tag}"
+    assert_that(getattr(context, flag)).described_as(flag).is_true()
@@ -2,49 +2,89 @@
 Step definitions for WBIA detection and identification scenarios
 """
 from behave import given, when, then
-import requests
-import os
+import io
+import ijson
+import orjson
 from assertpy import assert_that
+from step_helpers import assert_service_up
+
+
+def _parse(response):
+    """Decode a JSON response body, or None if it is not JSON"""
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _post_json(context, url, payload, timeout):
+    """POST a JSON payload and record the response on the context"""
+    response = context.session.post(url, json=payload, timeout=timeout)
+    context.response = response
+    context.status_code = response.status_code
+    context.response_json = _parse(response)
+
+
+def _stream_match_scores(response):
+    """Collect each match's score from a streamed query response
+
+    Only the scores are kept, so large match lists are never materialized.
+    Returns None when the body has no top-level 'matches' array.
+    """
+    response.raw.decode_content = True
+    scores = None
+    try:
+        for prefix, event, value in ijson.parse(response.raw, use_float=True):
+            if prefix == 'matches' and event == 'start_array':
+                scores = []
+            elif prefix == 'matches.item' and event not in ('map_key', 'end_map', 'end_array'):
+                scores.append(None)  # Stays None unless the match has a scalar score
+            elif prefix == 'matches.item.score':
+                scores[-1] = value
+    except ijson.JSONError:
+        return None
+    return scores
 
 
 @given('WBIA service is running')
 def step_verify_wbia_running(context):
     """Verify WBIA is accessible"""
-    response = requests.get(f"{context.wbia_url}/api/core/db/info/", timeout=10)
-    assert_that(response.status_code).is_equal_to(200)
+    assert_service_up(context, 'wbia_up', 'fixture.wbia')
 
 
 @given('I have test images in the test data directory')
 def step_verify_test_data_exists(context):
     """Verify test data directory exists"""
-    assert_that(os.path.exists(context.test_data_dir)).is_true()
+    assert_that(context.test_data_dir_exists).is_true()
 
 
 @given('I have a test image "{filename}"')
 def step_load_test_image(context, filename):
     """Load a test image file"""
-    image_path = os.path.join(context.test_data_dir, filename)
-    assert_that(os.path.exists(image_path)).is_true()
-    context.test_image_path = image_path
+    assert_that(context.image_cache).contains_key(filename)
     context.test_image_filename = filename
+    context.test_image_bytes = context.image_cache[filename]
 
 
 @when('I upload the image to WBIA')
 def step_upload_image_to_wbia(context):
     """Upload image to WBIA"""
-    with open(context.test_image_path, 'rb') as f:
-        files = {'image': (context.test_image_filename, f, 'image/jpeg')}
-        response = context.session.post(
-            f"{context.wbia_url}/api/upload/image/",
-            files=files,
-            timeout=context.timeout
-        )
+    # Cached bytes so the upload never touches the disk; the worker prefix keeps
+    # uploads from parallel runs distinguishable in WBIA
+    upload_name = f"{context.worker_id}_{context.test_image_filename}"
+    files = {
+        'image': (upload_name, io.BytesIO(context.test_image_bytes), 'image/jpeg')
+    }
+    response = context.session.post(
+        f"{context.wbia_url}/api/upload/image/",
+        files=files,
+        # Drop the session's JSON Content-Type so requests sets the multipart boundary
+        headers={'Content-Type': None},
+        timeout=context.timeout
+    )
     context.response = response
     context.status_code = response.status_code
-    try:
-        context.response_json = response.json()
-    except:
-        context.response_json = None
+    context.response_json = _parse(response)
 
 
 @then('the response should contain an image ID')
@@ -54,6 +94,7 @@ def step_verify_image_id_in_response(context):
     # WBIA typically returns gid (image ID)
     assert_that(context.response_json).contains_key('gid')
     context.uploaded_image_id = context.response_json['gid']
+    context.created_resources.append(('image', context.uploaded_image_id))
 
 
 @given('I have uploaded an image with ID "{image_id}"')
@@ -68,17 +109,7 @@ def step_request_detection(context):
     payload = {
         'gid_list': [context.uploaded_image_id]
     }
-    response = context.session.post(
-        f"{context.wbia_url}/api/engine/detect/cnn/",
-        json=payload,
-        timeout=context.long_timeout
-    )
-    context.response = response
-    context.status_code = response.status_code
-    try:
-        context.response_json = response.json()
-    except:
-        context.response_json = None
+    _post_json(context, f"{context.wbia_url}/api/engine/detect/cnn/", payload, context.long_timeout)
 
 
 @then('the response should contain detected annotations')
@@ -93,19 +124,19 @@ def step_verify_annotations_in_response(context):
 @then('each annotation should have a bounding box')
 def step_verify_bounding_boxes(context):
     """Verify each annotation has bbox"""
-    for annotation in context.annotations:
-        assert_that(annotation).contains_key('bbox')
-        bbox = annotation['bbox']
-        assert_that(bbox).is_length(4)  # [x, y, w, h]
+    # bbox is [x, y, w, h]
+    bad = [a for a in context.annotations if 'bbox' not in a or len(a['bbox']) != 4]
+    assert not bad, f"{len(bad)} annotation(s) without a 4-element bbox: {bad[:3]}"
 
 
 @then('each annotation should have a confidence score')
 def step_verify_confidence_scores(context):
     """Verify each annotation has confidence"""
-    for annotation in context.annotations:
-        assert_that(annotation).contains_key('confidence')
-        confidence = annotation['confidence']
-        assert_that(confidence).is_between(0.0, 1.0)
+    missing = [a for a in context.annotations if 'confidence' not in a]
+    assert not missing, f"{len(missing)} annotation(s) without a confidence: {missing[:3]}"
+    confidences = [a['confidence'] for a in context.annotations]
+    low, high = min(confidences), max(confidences)
+    assert 0.0 <= low and high <= 1.0, f"confidence outside [0, 1]: min={low}, max={high}"
 
 
 @given('I have an annotation with ID "{annot_id}"')
@@ -120,17 +151,7 @@ def step_request_species_classification(context):
     payload = {
         'aid_list': [context.annotation_id]
     }
-    response = context.session.post(
-        f"{context.wbia_url}/api/engine/classify/species/",
-        json=payload,
-        timeout=context.long_timeout
-    )
-    context.response = response
-    context.status_code = response.status_code
-    try:
-        context.response_json = response.json()
-    except:
-        context.response_json = None
+    _post_json(context, f"{context.wbia_url}/api/engine/classify/species/", payload, context.long_timeout)
 
 
 @then('the response should contain a species name')
@@ -154,32 +175,26 @@ def step_query_matching_individuals(context):
         'qaid_list': [context.annotation_id],
         'daid_list': None  # Query against entire database
     }
-    response = context.session.post(
+    with context.session.post(
         f"{context.wbia_url}/api/engine/query/graph/",
         json=payload,
-        timeout=context.long_timeout
-    )
-    context.response = response
-    context.status_code = response.status_code
-    try:
-        context.response_json = response.json()
-    except:
-        context.response_json = None
+        timeout=context.long_timeout,
+        stream=True
+    ) as response:
+        context.response = response
+        context.status_code = response.status_code
+        context.match_scores = _stream_match_scores(response)
 
 
 @then('the response should contain a ranked list of matches')
 def step_verify_ranked_matches(context):
     """Verify matching results"""
-    assert_that(context.response_json).is_not_none()
-    assert_that(context.response_json).contains_key('matches')
-    context.matches = context.response_json['matches']
-    assert_that(context.matches).is_instance_of(list)
+    # None means the streamed body had no 'matches' array
+    assert isinstance(context.match_scores, list), "response has no 'matches' array"
 
 
 @then('each match should have a similarity score')
 def step_verify_similarity_scores(context):
     """Verify each match has a score"""
-    for match in context.matches:
-        assert_that(match).contains_key('score')
-        score = match['score']
-        assert_that(score).is_instance_of((int, float))
\ No newline at end of file
+    bad = [i for i, score in enumerate(context.match_scores) if not isinstance(score, (int, float))]
+    assert not bad, f"{len(bad)} match(es) without a numeric score, at indices {bad[:10]}"
\ No newline at end of file
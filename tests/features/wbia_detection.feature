@@ -1,3 +1,4 @@
+@fixture.wbia
 Feature: WBIA Animal Detection
   As a wildlife researcher
   I want to detect animals in uploaded images
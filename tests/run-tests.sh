@@ -22,6 +22,7 @@ usage() {
     echo "  wildbook      Run Wildbook tests only"
     echo "  integration   Run integration tests only"
     echo "  feature FILE  Run specific feature file"
+    echo "  parallel [N]  Run all tests in N worker processes (default 4)"
     echo "  shell         Open shell in test container"
     echo ""
     echo "Options:"
@@ -33,6 +34,7 @@ usage() {
     echo "  ./run-tests.sh health --build"
     echo "  ./run-tests.sh wbia"
     echo "  ./run-tests.sh feature features/health_checks.feature"
+    echo "  ./run-tests.sh parallel 8"
     echo "  ./run-tests.sh shell"
 }
 
@@ -88,6 +90,12 @@ case "$COMMAND" in
         echo -e "${GREEN}Running feature: $2${NC}"
         docker-compose run --rm tests behave "$2"
         ;;
+    parallel)
+        PROCESSES="${2:-4}"
+        echo -e "${GREEN}Running all tests in ${PROCESSES} parallel workers${NC}"
+        docker-compose run --rm tests behavex --parallel-processes "$PROCESSES" \
+            --parallel-scheme feature -o reports/behavex
+        ;;
     shell)
         echo -e "${GREEN}Opening shell in test container${NC}"
         docker-compose run --rm tests bash